@@ -0,0 +1,535 @@
+"""
+Local load-test harness for the weapon detection API (app.py).
+
+Runs the real FastAPI app in a child process with the webcam replaced by a
+synthetic or looped-video frame source and email sending stubbed out, then
+drives it with concurrent /api/video_feed consumers and /api/logs + /api/stats
+pollers. Each stage ramps the number of stream clients up and reports
+delivered FPS per client, API latency percentiles and server CPU / RSS.
+
+Usage:
+    python load_test.py --source synthetic --resolution 640x480 --fps 30 --clients 1,2,4,8
+    python load_test.py --source Results/detected_objects_video.mp4 --clients 1,4 --pollers 4
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+try:
+    import psutil
+except ImportError:  # Fall back to /proc on Linux when psutil is not installed
+    psutil = None
+
+# Errors that mean the server process is gone or unreadable while sampling
+_SAMPLER_ERRORS = (OSError, IndexError, ValueError) + ((psutil.Error,) if psutil is not None else ())
+
+
+class PacedFrameSource:
+    """
+    Base for cv2.VideoCapture stand-ins that deliver frames at a fixed FPS
+
+    Frames are paced like a real webcam, so consumers sharing the source
+    split its frame rate between them.
+    """
+
+    def __init__(self, width: int, height: int, fps: float):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frame_count = 0
+        self._next_frame_time = time.monotonic()
+        self._opened = True
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def set(self, prop_id, value) -> bool:
+        return False
+
+    def get(self, prop_id) -> float:
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop_id == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        return 0.0
+
+    def _wait_for_next_frame(self):
+        now = time.monotonic()
+        if self._next_frame_time > now:
+            time.sleep(self._next_frame_time - now)
+        # Do not build up a backlog if consumers fall behind the source rate
+        self._next_frame_time = max(self._next_frame_time, now) + 1.0 / self.fps
+
+    def _next_frame(self):
+        raise NotImplementedError
+
+    def read(self):
+        if not self._opened:
+            return False, None
+        self._wait_for_next_frame()
+        frame = self._next_frame()
+        if frame is None:
+            return False, None
+        self.frame_count += 1
+        return True, frame
+
+    def release(self):
+        self._opened = False
+
+
+class SyntheticFrameSource(PacedFrameSource):
+    """Stand-in for cv2.VideoCapture that produces generated frames"""
+
+    def __init__(self, width: int = 640, height: int = 480, fps: float = 30.0, pool_size: int = 30):
+        super().__init__(width, height, fps)
+
+        # Pre-render noisy frames so JPEG encoding cost resembles a camera image
+        rng = np.random.default_rng(0)
+        horizontal = np.tile(np.linspace(0, 255, width, dtype=np.uint8), (height, 1))
+        vertical = np.tile(np.linspace(0, 255, height, dtype=np.uint8)[:, None], (1, width))
+        self._pool = []
+        for i in range(pool_size):
+            noise = rng.integers(0, 64, (height, width, 3), dtype=np.uint8)
+            frame = cv2.merge([np.roll(horizontal, i * 8, axis=1), vertical, horizontal])
+            self._pool.append(cv2.add(frame, noise))
+
+    def _next_frame(self):
+        frame = self._pool[self.frame_count % len(self._pool)].copy()
+        cv2.putText(frame, f"frame {self.frame_count}", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2, cv2.LINE_AA)
+        return frame
+
+
+class LoopingVideoSource(PacedFrameSource):
+    """Stand-in for cv2.VideoCapture that replays a video file forever"""
+
+    def __init__(self, video_path: str, width: Optional[int] = None, height: Optional[int] = None,
+                 fps: Optional[float] = None):
+        self.video_path = video_path
+        self.capture = cv2.VideoCapture(video_path)
+        if not self.capture.isOpened():
+            raise RuntimeError(f"Could not open video file {video_path}")
+        super().__init__(width or int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                         height or int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                         fps or self.capture.get(cv2.CAP_PROP_FPS) or 30.0)
+        self._resize = width is not None and height is not None
+
+    def _next_frame(self):
+        success, frame = self.capture.read()
+        if not success:
+            # Rewind at end of file
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, frame = self.capture.read()
+            if not success:
+                return None
+        if self._resize:
+            frame = cv2.resize(frame, (self.width, self.height))
+        return frame
+
+    def release(self):
+        super().release()
+        self.capture.release()
+
+
+def create_frame_source(source: str, resolution: Optional[str] = None, fps: Optional[float] = None):
+    """Build a frame source from the --source / --resolution / --fps options"""
+    width = height = None
+    if resolution:
+        width, height = (int(v) for v in resolution.lower().split('x'))
+    if source == 'synthetic':
+        return SyntheticFrameSource(width or 640, height or 480, fps or 30.0)
+    return LoopingVideoSource(source, width, height, fps)
+
+
+def serve(args):
+    """Run app.py with the frame source injected and email alerts stubbed (child process)"""
+    import uvicorn
+    import app as app_module
+
+    source = create_frame_source(args.source, args.resolution, args.fps)
+    # initialize_camera() reuses any already-open camera, so injecting the source is enough
+    app_module.camera = source
+    app_module.email_service.send_alert = lambda detection: None
+    print(f"Serving app.py with {type(source).__name__} "
+          f"{source.width}x{source.height} @ {source.fps:.1f} FPS on port {args.port}")
+    uvicorn.run(app_module.app, host=args.host, port=args.port, log_level="warning")
+
+
+class ProcessSampler(threading.Thread):
+    """Samples CPU % and RSS of the server process in the background"""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.stage = None
+        self.samples: List[Dict] = []
+        self._stop_event = threading.Event()
+        self._process = None
+        self._clock_ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self._page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+    def _read_cpu_seconds_and_rss(self):
+        if self._process is not None:
+            with self._process.oneshot():
+                times = self._process.cpu_times()
+                return times.user + times.system, self._process.memory_info().rss
+        with open(f"/proc/{self.pid}/stat") as f:
+            # Fields after the parenthesised command name; utime and stime are 14 and 15
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f"/proc/{self.pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+        return (int(fields[11]) + int(fields[12])) / self._clock_ticks, rss_pages * self._page_size
+
+    def run(self):
+        start = time.monotonic()
+        last_time = start
+        try:
+            if psutil is not None:
+                self._process = psutil.Process(self.pid)
+            last_cpu, _ = self._read_cpu_seconds_and_rss()
+        except _SAMPLER_ERRORS as e:
+            print(f"Could not sample server process: {e}")
+            return
+        while not self._stop_event.wait(self.interval):
+            try:
+                cpu, rss = self._read_cpu_seconds_and_rss()
+            except _SAMPLER_ERRORS as e:
+                print(f"Stopped sampling server process: {e}")
+                return
+            now = time.monotonic()
+            self.samples.append({
+                't': round(now - start, 2),
+                'stage': self.stage,
+                'cpu_percent': round(100.0 * (cpu - last_cpu) / (now - last_time), 1),
+                'rss_mb': round(rss / (1024 * 1024), 1)
+            })
+            last_time, last_cpu = now, cpu
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def stream_client(base_url: str, stop_event: threading.Event, result: Dict):
+    """Consume /api/video_feed and count delivered frames"""
+    host, port = base_url.split('//', 1)[1].split(':')
+    conn = http.client.HTTPConnection(host, int(port), timeout=10)
+    frames = 0
+    first_frame_time = None
+    buffer = b''
+    start = time.monotonic()
+    try:
+        conn.request('GET', '/api/video_feed')
+        response = conn.getresponse()
+        while not stop_event.is_set():
+            chunk = response.read1(65536)
+            if not chunk:
+                result['error'] = 'stream closed by server'
+                break
+            buffer += chunk
+            count = buffer.count(b'--frame\r\n')
+            if count:
+                if first_frame_time is None:
+                    first_frame_time = time.monotonic()
+                frames += count
+                buffer = buffer[buffer.rfind(b'--frame\r\n') + len(b'--frame\r\n'):]
+            # Keep only the tail so a boundary split across reads is still found
+            buffer = buffer[-16:]
+    except (OSError, http.client.HTTPException) as e:
+        result['error'] = str(e)
+    finally:
+        conn.close()
+    # Measure delivered FPS from the first frame so connection setup is not counted
+    if first_frame_time is not None:
+        elapsed = time.monotonic() - first_frame_time
+        result['fps'] = (frames - 1) / elapsed if elapsed > 0 else 0.0
+        result['time_to_first_frame'] = first_frame_time - start
+    else:
+        result['fps'] = 0.0
+        result['time_to_first_frame'] = None
+    result['frames'] = frames
+
+
+def api_poller(base_url: str, interval: float, stop_event: threading.Event, latencies: Dict[str, List[float]],
+               errors: List[str]):
+    """Poll /api/logs and /api/stats like the dashboard does, recording latency"""
+    while not stop_event.is_set():
+        for endpoint in ('/api/logs', '/api/stats'):
+            start = time.monotonic()
+            try:
+                with urllib.request.urlopen(base_url + endpoint, timeout=10) as response:
+                    response.read()
+                latencies[endpoint].append(time.monotonic() - start)
+            except (OSError, urllib.error.URLError, http.client.HTTPException) as e:
+                errors.append(f"{endpoint}: {e}")
+        stop_event.wait(interval)
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100.0 * len(ordered)) - 1
+    return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+
+def run_stage(base_url: str, clients: int, pollers: int, duration: float, poll_interval: float) -> Dict:
+    """Run one load stage with the given number of stream clients and pollers"""
+    stop_event = threading.Event()
+    stream_results = [{} for _ in range(clients)]
+    latencies = {'/api/logs': [], '/api/stats': []}
+    errors: List[str] = []
+
+    threads = [threading.Thread(target=stream_client, args=(base_url, stop_event, r), daemon=True)
+               for r in stream_results]
+    threads += [threading.Thread(target=api_poller, args=(base_url, poll_interval, stop_event, latencies, errors),
+                                 daemon=True)
+                for _ in range(pollers)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop_event.set()
+    for t in threads:
+        t.join(timeout=15)
+
+    client_fps = [round(r.get('fps', 0.0), 2) for r in stream_results]
+    first_frame_times = [r['time_to_first_frame'] for r in stream_results if r.get('time_to_first_frame') is not None]
+    errors += [r['error'] for r in stream_results if r.get('error')]
+    api = {}
+    for endpoint, values in latencies.items():
+        p50, p99 = percentile(values, 50), percentile(values, 99)
+        api[endpoint] = {
+            'requests': len(values),
+            'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'p99_ms': round(p99 * 1000, 1) if p99 is not None else None
+        }
+    return {
+        'clients': clients,
+        'pollers': pollers,
+        'client_fps': client_fps,
+        'min_client_fps': min(client_fps) if client_fps else None,
+        'aggregate_fps': round(sum(client_fps), 2),
+        'max_time_to_first_frame_ms': round(max(first_frame_times) * 1000, 1) if first_frame_times else None,
+        'api': api,
+        'errors': errors[:20],
+        'error_count': len(errors)
+    }
+
+
+def find_degradation(stages: List[Dict], min_client_fps: float, max_p99_ms: float, min_fps_ratio: float):
+    """Return (stage, reason) for the first stage where quality degrades, or None"""
+    # Clients share one paced source, so per-client FPS falls as ~1/N by design;
+    # a drop in aggregate FPS is what signals the server is saturated
+    peak_aggregate_fps = None
+    for stage in stages:
+        reasons = []
+        if stage.get('server_exit_code') is not None:
+            reasons.append(f"server exited with code {stage['server_exit_code']}")
+        if stage['clients']:
+            if stage['min_client_fps'] < min_client_fps:
+                reasons.append(f"min client FPS {stage['min_client_fps']} < {min_client_fps}")
+            if peak_aggregate_fps and stage['aggregate_fps'] < min_fps_ratio * peak_aggregate_fps:
+                reasons.append(f"aggregate FPS {stage['aggregate_fps']} < {min_fps_ratio:.0%} of "
+                               f"peak {peak_aggregate_fps}")
+            peak_aggregate_fps = max(peak_aggregate_fps or 0.0, stage['aggregate_fps'])
+        for endpoint, stats in stage['api'].items():
+            if stats['p99_ms'] is not None and stats['p99_ms'] > max_p99_ms:
+                reasons.append(f"{endpoint} p99 {stats['p99_ms']} ms > {max_p99_ms} ms")
+        if stage['error_count']:
+            reasons.append(f"{stage['error_count']} errors")
+        if reasons:
+            return stage, '; '.join(reasons)
+    return None
+
+
+def wait_for_server(base_url: str, server: subprocess.Popen, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(base_url + '/api/health', timeout=2):
+                return True
+        except (OSError, urllib.error.URLError):
+            time.sleep(0.5)
+    return False
+
+
+def warm_up(base_url: str, timeout: float) -> bool:
+    """Open /api/video_feed until the first frame arrives so the lazy YOLO load happens outside any stage"""
+    host, port = base_url.split('//', 1)[1].split(':')
+    conn = http.client.HTTPConnection(host, int(port), timeout=timeout)
+    try:
+        conn.request('GET', '/api/video_feed')
+        response = conn.getresponse()
+        buffer = b''
+        while b'--frame\r\n' not in buffer:
+            chunk = response.read1(65536)
+            if not chunk:
+                return False
+            buffer += chunk
+        return True
+    except (OSError, http.client.HTTPException) as e:
+        print(f"Warm-up failed: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def print_report(report: Dict):
+    print("\n=== Load test report ===")
+    print(f"Source: {report['config']['source']}  resolution: {report['config']['resolution'] or 'native'}  "
+          f"fps: {report['config']['fps'] or 'native'}")
+    print(f"{'clients':>7} {'pollers':>7} {'min fps':>8} {'agg fps':>8} "
+          f"{'ttff ms':>8} {'logs p99':>9} {'stats p99':>10} {'cpu %':>7} {'rss MB':>7} {'errors':>6}")
+    for stage in report['stages']:
+        print(f"{stage['clients']:>7} {stage['pollers']:>7} {str(stage['min_client_fps']):>8} "
+              f"{stage['aggregate_fps']:>8} {str(stage['max_time_to_first_frame_ms']):>8} "
+              f"{str(stage['api']['/api/logs']['p99_ms']):>9} "
+              f"{str(stage['api']['/api/stats']['p99_ms']):>10} {str(stage.get('mean_cpu_percent')):>7} "
+              f"{str(stage.get('max_rss_mb')):>7} {stage['error_count']:>6}")
+    degradation = report['degradation']
+    if degradation:
+        print(f"\nQuality degrades at {degradation['clients']} clients: {degradation['reason']}")
+    else:
+        print("\nNo degradation detected within the tested range")
+
+
+def run(args):
+    base_url = f"http://{args.host}:{args.port}"
+    source = args.source
+    if source != 'synthetic':
+        # The server runs from another directory, so resolve the path against ours
+        source = os.path.abspath(source)
+        if not os.path.isfile(source):
+            print(f"Error: Video file not found: {source}")
+            raise SystemExit(2)
+    command = [sys.executable, os.path.abspath(__file__), '--serve',
+               '--source', source, '--host', args.host, '--port', str(args.port)]
+    if args.resolution:
+        command += ['--resolution', args.resolution]
+    if args.fps:
+        command += ['--fps', str(args.fps)]
+
+    # The server runs from this directory so app.py finds its model weights
+    server = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)))
+    sampler = None
+    stages = []
+    try:
+        print("Waiting for server to start...")
+        if not wait_for_server(base_url, server, args.startup_timeout):
+            print("Error: Server did not become healthy")
+            raise SystemExit(1)
+        print("Warming up (loading YOLO model on first frame)...")
+        if not warm_up(base_url, args.startup_timeout):
+            print("Error: Server did not deliver a video frame")
+            raise SystemExit(1)
+        time.sleep(args.cooldown)
+
+        sampler = ProcessSampler(server.pid, args.sample_interval)
+        sampler.start()
+        for index, clients in enumerate(args.clients):
+            sampler.stage = index
+            print(f"Stage {index}: {clients} stream clients, {args.pollers} pollers for {args.duration:.0f}s...")
+            stage = run_stage(base_url, clients, args.pollers, args.duration, args.poll_interval)
+            sampler.stage = 'cooldown'
+            stage['stage'] = index
+            # Let the server notice disconnected clients before the next stage
+            time.sleep(args.cooldown)
+            stage['server_exit_code'] = server.poll()
+            stage_samples = [s for s in sampler.samples if s['stage'] == index]
+            if stage_samples:
+                stage['mean_cpu_percent'] = round(
+                    sum(s['cpu_percent'] for s in stage_samples) / len(stage_samples), 1)
+                stage['max_rss_mb'] = max(s['rss_mb'] for s in stage_samples)
+            stages.append(stage)
+            if stage['server_exit_code'] is not None:
+                print(f"Error: Server exited with code {stage['server_exit_code']}, stopping")
+                break
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    degradation = find_degradation(stages, args.min_client_fps, args.max_p99_ms, args.min_fps_ratio)
+    report = {
+        'config': {
+            'source': args.source,
+            'resolution': args.resolution,
+            'fps': args.fps,
+            'pollers': args.pollers,
+            'duration': args.duration,
+            'poll_interval': args.poll_interval,
+            'thresholds': {
+                'min_client_fps': args.min_client_fps,
+                'max_p99_ms': args.max_p99_ms,
+                'min_fps_ratio': args.min_fps_ratio
+            }
+        },
+        'stages': stages,
+        'resource_samples': sampler.samples if sampler is not None else [],
+        'degradation': {'clients': degradation[0]['clients'], 'reason': degradation[1]} if degradation else None
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Full report saved to: {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the weapon detection API with a synthetic camera")
+    parser.add_argument("--source", type=str, default="synthetic",
+                        help="'synthetic' or path to a video file to loop (default: synthetic)")
+    parser.add_argument("--resolution", type=str, help="Frame size as WIDTHxHEIGHT (default: 640x480 / native)")
+    parser.add_argument("--fps", type=float, help="Source frame rate (default: 30 / native)")
+    parser.add_argument("--clients", type=str, default="1,2,4,8",
+                        help="Comma-separated /api/video_feed client counts, one stage each (default: 1,2,4,8)")
+    parser.add_argument("--pollers", type=int, default=2, help="Concurrent /api/logs + /api/stats pollers (default: 2)")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between polls (default: 1.0)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per stage (default: 20)")
+    parser.add_argument("--cooldown", type=float, default=2.0, help="Seconds between stages (default: 2)")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="CPU/RSS sampling interval (default: 0.5)")
+    parser.add_argument("--min-client-fps", type=float, default=5.0,
+                        help="Degraded if any client falls below this FPS (default: 5)")
+    parser.add_argument("--max-p99-ms", type=float, default=500.0,
+                        help="Degraded if API p99 latency exceeds this (default: 500)")
+    parser.add_argument("--min-fps-ratio", type=float, default=0.8,
+                        help="Degraded if aggregate FPS drops below this fraction of the best earlier stage (default: 0.8)")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Server host (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Server port (default: 8765)")
+    parser.add_argument("--startup-timeout", type=float, default=120.0, help="Seconds to wait for the server")
+    parser.add_argument("--output", type=str, help="Write the full JSON report to this path")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+    else:
+        try:
+            args.clients = [int(c) for c in args.clients.split(',') if c.strip()]
+        except ValueError:
+            print("Error: --clients must be a comma-separated list of integers")
+            raise SystemExit(2)
+        run(args)